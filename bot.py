@@ -2,23 +2,33 @@
 # -*- coding: utf-8 -*-
 
 import argparse
+import os
 import sys
+import signal
 import logging
 import re
-import yaml
+import threading
 from functools import wraps
 from datetime import datetime, timedelta
+from itertools import chain
 from collections import OrderedDict
+from config import CONFIG_PATH, load_config
 from ecoline import Ecoline
+from stats import append_history, iter_history, last_history_record, order_stats
+from outbox import Outbox
 from telegram.ext import Updater, CommandHandler, MessageHandler, Filters, CallbackQueryHandler
 from telegram import ReplyKeyboardMarkup, InlineKeyboardMarkup, InlineKeyboardButton, ChatAction
 from emoji import emojize
 
 
+CONFIG_RELOAD_INTERVAL = 30
+
+
 def get_config():
+    global config_mtime
     try:
-        with open("config.yml", 'r') as ymlfile:
-            cfg = yaml.load(ymlfile)
+        config_mtime = os.path.getmtime(CONFIG_PATH)
+        cfg = load_config()
     except Exception as exc:
         logger.error('Config file error: {}'.format(exc))
         sys.exit(1)
@@ -26,6 +36,44 @@ def get_config():
         return cfg
 
 
+def request_reload(signum, frame):
+    # Signal handlers must not block, load and re-login run in the job queue thread
+    updater.job_queue.run_once(lambda bot, job: reload_config(), 0)
+
+
+def reload_config():
+    global cfg, ecoline, config_mtime
+    with config_lock:
+        try:
+            config_mtime = os.path.getmtime(CONFIG_PATH)
+            config = load_config()
+        except Exception as exc:
+            logger.error('Config reload error, keep previous config: {}'.format(exc))
+            return
+
+        if config['telegram']['token'] != cfg['telegram']['token']:
+            logger.warning('Telegram token change requires bot restart')
+
+        relogin = (config['ecoline']['username'] != cfg['ecoline']['username'] or
+                   config['ecoline']['password'] != cfg['ecoline']['password'])
+
+        # Single global assignment, handlers see either the old or the new config
+        cfg = config
+        if relogin:
+            ecoline = ecoline_auth(debug=args_debug)
+        logger.info('Config reloaded')
+
+
+def watch_config(bot, job):
+    try:
+        mtime = os.path.getmtime(CONFIG_PATH)
+    except OSError as exc:
+        logger.error('Config file error: {}'.format(exc))
+    else:
+        if mtime != config_mtime:
+            reload_config()
+
+
 def init_log(debug=None):
     if debug:
         consolelog_level = logging.DEBUG
@@ -70,21 +118,12 @@ def restricted(func):
     def wrapped(bot, update, *args, **kwargs):
         user_id = update.effective_user.id
         chat_id = update.effective_chat.id
+        access = cfg['telegram']
 
-        if cfg['telegram']['allow_chat']:
-            allowed_group = chat_id in cfg['telegram']['allow_chat']
-        else:
-            allowed_group = False
-
-        if cfg['telegram']['allow_user']:
-            allowed_user = user_id in cfg['telegram']['allow_user']
-        else:
-            allowed_user = False
-
-        if allowed_user or allowed_group:
+        if user_id in access['allow_user'] or chat_id in access['allow_chat']:
             return func(bot, update, *args, **kwargs)
         else:
-            bot.sendMessage(
+            outbox.sendMessage(
                 chat_id=update.message.chat_id,
                 text=u'Ой! Вы не авторизованы для работы с ботом.'
             )
@@ -185,19 +224,19 @@ def make_apply_keyboard():
 
 
 def order_handler(bot, update):
-    bot.sendChatAction(update.callback_query.message.chat.id, action=ChatAction.TYPING)
+    outbox.sendChatAction(update.callback_query.message.chat.id, action=ChatAction.TYPING)
     global ecoline
     ecoline = ecoline_auth(ecoline)
 
     if update.callback_query.data == 'order':
-        bot.editMessageReplyMarkup(
+        outbox.editMessageReplyMarkup(
             message_id=update.callback_query.message.message_id,
             chat_id=update.callback_query.message.chat.id,
             reply_markup=make_date_keyboard()
         )
     elif update.callback_query.data == 'cancel':
         ecoline.clear_basket()
-        bot.delete_message(
+        outbox.delete_message(
             message_id=update.callback_query.message.message_id,
             chat_id=update.callback_query.message.chat.id,
         )
@@ -205,7 +244,7 @@ def order_handler(bot, update):
     elif re.match('^date:(\d+\.\d+\.\d+)', update.callback_query.data):
         date = re.search('^date:(\d+\.\d+\.\d+)', update.callback_query.data).group(1)
         order_properties['ORDER_PROP_6'] = date
-        bot.editMessageText(
+        outbox.editMessageText(
             message_id=update.callback_query.message.message_id,
             chat_id=update.callback_query.message.chat.id,
             text=update.callback_query.message.text + u'\r\n\r\nДата доставки: {}'.format(date),
@@ -219,7 +258,7 @@ def order_handler(bot, update):
             order_properties.update(ecoline.get_order_properties())
         except Exception as exc:
             error(bot, update, exc)
-            bot.editMessageText(
+            outbox.editMessageText(
                 message_id=update.callback_query.message.message_id,
                 chat_id=update.callback_query.message.chat.id,
                 text=u'Ой! Произошла ошибка. Попробуйте еще раз позже.',
@@ -237,7 +276,7 @@ def order_handler(bot, update):
             except Exception as exc:
                 logger.error('Pay error "%s"' % exc)
                 order_properties['PAY_SYSTEM_ID'] = 1
-                bot.editMessageText(
+                outbox.editMessageText(
                     message_id=update.callback_query.message.message_id,
                     chat_id=update.callback_query.message.chat.id,
                     text=update.callback_query.message.text + u'\r\nВремя доставки: {}\r\nОплата: Наличными'.format(time_periods[time_id]),
@@ -245,7 +284,7 @@ def order_handler(bot, update):
                 )
             else:
                 if bonus >= cost:
-                    bot.editMessageText(
+                    outbox.editMessageText(
                         message_id=update.callback_query.message.message_id,
                         chat_id=update.callback_query.message.chat.id,
                         text=update.callback_query.message.text + u'\r\nВремя доставки: {}'.format(time_periods[time_id]),
@@ -253,17 +292,17 @@ def order_handler(bot, update):
                     )
                 else:
                     order_properties['PAY_SYSTEM_ID'] = 1
-                    bot.editMessageText(message_id=update.callback_query.message.message_id,
-                                        chat_id=update.callback_query.message.chat.id,
-                                        text=update.callback_query.message.text + u'\r\nВремя доставки: {}\r\nОплата: Наличными'.format(time_periods[time_id]),
-                                        reply_markup=make_apply_keyboard()
-                                        )
+                    outbox.editMessageText(message_id=update.callback_query.message.message_id,
+                                           chat_id=update.callback_query.message.chat.id,
+                                           text=update.callback_query.message.text + u'\r\nВремя доставки: {}\r\nОплата: Наличными'.format(time_periods[time_id]),
+                                           reply_markup=make_apply_keyboard()
+                                           )
 
     elif re.match('^pay:[1-2]{1}', update.callback_query.data):
         pay_id = int(re.search('^pay:([1-2]{1})', update.callback_query.data).group(1))
         if pay_id == 1:
             order_properties['PAY_SYSTEM_ID'] = 1
-            bot.editMessageText(
+            outbox.editMessageText(
                 message_id=update.callback_query.message.message_id,
                 chat_id=update.callback_query.message.chat.id,
                 text=update.callback_query.message.text + u'\r\nОплата: Наличными',
@@ -271,7 +310,7 @@ def order_handler(bot, update):
             )
         elif pay_id == 2:
             order_properties['PAY_SYSTEM_ID'] = 2
-            bot.editMessageText(
+            outbox.editMessageText(
                 message_id=update.callback_query.message.message_id,
                 chat_id=update.callback_query.message.chat.id,
                 text=update.callback_query.message.text + u'\r\nОплата: Бонусами',
@@ -283,7 +322,7 @@ def order_handler(bot, update):
             order_status = ecoline.checkout(order_properties)
         except Exception as exc:
             error(bot, update, exc)
-            bot.editMessageText(
+            outbox.editMessageText(
                 message_id=update.callback_query.message.message_id,
                 chat_id=update.callback_query.message.chat.id,
                 text=u'Ой! Произошла ошибка. Попробуйте еще раз позже.',
@@ -295,45 +334,46 @@ def order_handler(bot, update):
                 error(bot, update, exc)
         else:
             if order_status['status'] == 'ok' and order_status['properties'] == 'ok':
-                bot.editMessageText(
+                outbox.editMessageText(
                     message_id=update.callback_query.message.message_id,
                     chat_id=update.callback_query.message.chat.id,
                     text=update.callback_query.message.text + u'\r\nСтатус заказа: {}'.format(emojize(':white_check_mark:', use_aliases=True)),
                     reply_markup=False
                 )
             elif order_status['status'] == 'error':
-                bot.editMessageText(
+                outbox.editMessageText(
                     message_id=update.callback_query.message.message_id,
                     chat_id=update.callback_query.message.chat.id,
                     text=update.callback_query.message.text + u'\r\nСтатус заказа: {}'.format(emojize(':no_entry:', use_aliases=True)),
                     reply_markup=False
                 )
             elif order_status['status'] == 'ok' and order_status['properties'] == 'error':
-                bot.editMessageText(
+                outbox.editMessageText(
                     message_id=update.callback_query.message.message_id,
                     chat_id=update.callback_query.message.chat.id,
                     text=update.callback_query.message.text + u'\r\nСтатус заказа: {} {}'.format(emojize(':rotating_light:', use_aliases=True), 'Заказ принят. Фактическое содержимое корзины не совпадает с заданным в заказе.'),
                     reply_markup=False
                 )
 
-            try:
-                history = open(cfg['common']['history_path'], 'w')
-            except:
-                history = open('order.log', 'w')
-
             date_now = datetime.today().date().strftime('%d.%m.%Y')
             time_now = datetime.today().strftime('%H:%m:%S')
             order_date = order_properties['ORDER_PROP_6']
             order_time = time_periods[order_properties['ORDER_PROP_7']]
             order_pay = 'Наличными' if order_properties['PAY_SYSTEM_ID'] == 1 else 'Бонусами'
-            history.write('{0};{1};{2};{3};{4};{5};{6}'.format(date_now,
-                                                               time_now,
-                                                               order_date,
-                                                               order_time,
-                                                               order_pay,
-                                                               update.callback_query.from_user.first_name,
-                                                               update.callback_query.from_user.id))
-            history.close()
+            history_line = '{0};{1};{2};{3};{4};{5};{6};{7}'.format(date_now,
+                                                                   time_now,
+                                                                   order_date,
+                                                                   order_time,
+                                                                   order_pay,
+                                                                   update.callback_query.from_user.first_name,
+                                                                   update.callback_query.from_user.id,
+                                                                   ecoline.quantity)
+            # Rejected orders must not count in /stats
+            if order_status['status'] == 'ok':
+                try:
+                    append_history(cfg['common']['history_path'], history_line)
+                except:
+                    append_history('order.log', history_line)
             logger.info(u'Order request: [Date: {0}, Time: {1}, Pay: {2}] from user {3}, id {4}, order id {5}, order status {6}, properties status: {7}'.format(order_date,
                                                                                                                                                                 order_time,
                                                                                                                                                                 order_pay.decode('utf-8'),
@@ -362,7 +402,7 @@ def error(bot, update, error):
 
 @restricted
 def start(bot, update):
-    bot.sendMessage(
+    outbox.sendMessage(
         chat_id=update.message.chat_id,
         text=u'Добро пожаловать.',
         reply_markup=make_reply_keyboard()
@@ -371,15 +411,15 @@ def start(bot, update):
 
 @restricted
 def help(bot, update):
-    bot.sendMessage(
+    outbox.sendMessage(
         chat_id=update.message.chat_id,
-        text=u'Заказ - произвести заказ воды\r\nБонус - просмотр бонусного баланса\r\nИстория - просмотр истории заказов'
+        text=u'Заказ - произвести заказ воды\r\nБонус - просмотр бонусного баланса\r\nИстория - просмотр истории заказов\r\n/stats - статистика и прогноз следующего заказа'
     )
 
 
 @restricted
 def unknown(bot, update):
-    bot.sendMessage(
+    outbox.sendMessage(
         chat_id=update.message.chat_id,
         text=u'Простите, я не поддерживаю этот тип запросов.'
     )
@@ -387,20 +427,20 @@ def unknown(bot, update):
 
 @restricted
 def bonus(bot, update):
-    bot.sendChatAction(update.message.chat_id, action=ChatAction.TYPING)
+    outbox.sendChatAction(update.message.chat_id, action=ChatAction.TYPING)
     try:
         global ecoline
         ecoline = ecoline_auth(ecoline)
         bonus = ecoline.get_bonus()
     except Exception as exc:
         error(bot, update, exc)
-        bot.sendMessage(
+        outbox.sendMessage(
             chat_id=update.message.chat_id,
             text=u'Ой! Произошла ошибка. Попробуйте еще раз позже.'
         )
     else:
         if bonus:
-            bot.sendMessage(
+            outbox.sendMessage(
                 chat_id=update.message.chat_id,
                 text=u'Бонусный баланс: {}'.format(int(bonus))
             )
@@ -410,7 +450,7 @@ def bonus(bot, update):
 
 @restricted
 def history(bot, update):
-    bot.sendChatAction(update.message.chat_id, action=ChatAction.TYPING)
+    outbox.sendChatAction(update.message.chat_id, action=ChatAction.TYPING)
     try:
         global ecoline
         ecoline = ecoline_auth(ecoline)
@@ -419,19 +459,19 @@ def history(bot, update):
         error(bot, update, exc)
     else:
         if orders_history:
-            bot.sendMessage(
+            outbox.sendMessage(
                 chat_id=update.message.chat_id,
                 text=u'Информация с сайта:\r\nПредыдущий заказ был сделан: {}\r\nПрошло дней: {}'.format(orders_history['date'], orders_history['diff'])
             )
             try:
-                history = open(cfg['common']['history_path'], 'r')
+                history_item = last_history_record(cfg['common']['history_path'])
             except:
-                history = open('order.log', 'r')
-            history_item = history.readline().split(';')
-            if history_item and history_item[0] != '':
+                history_item = last_history_record('order.log')
+            if history_item:
+                history_item = history_item[:7]
                 history_item.append((datetime.now() - datetime.strptime(history_item[0], '%d.%m.%Y')).days)
                 history_item[4] = history_item[4].decode('utf-8')
-                bot.sendMessage(
+                outbox.sendMessage(
                     chat_id=update.message.chat_id,
                     text=u'Информация от бота:\r\nПредыдущий заказ был сделан: {} {}\r\nЗаказ на дату: {}\r\nЗаказ на время: {}\r\nОплата: {}\r\nПользователь: {} (id: {})\r\nПрошло дней: {}'''.format(*history_item)
                 )
@@ -439,9 +479,63 @@ def history(bot, update):
                                                                                       update.message.from_user.id))
 
 
+def history_path():
+    if os.path.exists(cfg['common']['history_path'] or ''):
+        return cfg['common']['history_path']
+    return 'order.log'
+
+
+def get_order_stats():
+    last_order = ecoline.get_last_order()
+    path = history_path()
+    mtime = os.path.getmtime(path) if os.path.exists(path) else None
+    quantity = cfg['ecoline']['product']['quantity']
+    key = (last_order['date'] if last_order else None, mtime, quantity)
+    if stats_cache.get('key') == key:
+        return stats_cache['value']
+
+    orders = ((datetime.strptime(date, '%d.%m.%Y').date(), None) for date in ecoline.iter_orders())
+    if mtime is not None:
+        orders = chain(orders, iter_history(path))
+    value = order_stats(orders, quantity)
+    stats_cache.update({'key': key, 'value': value})
+    return value
+
+
+@restricted
+def stats(bot, update):
+    outbox.sendChatAction(update.message.chat_id, action=ChatAction.TYPING)
+    try:
+        global ecoline
+        ecoline = ecoline_auth(ecoline)
+        orders_stats = get_order_stats()
+    except Exception as exc:
+        error(bot, update, exc)
+        outbox.sendMessage(
+            chat_id=update.message.chat_id,
+            text=u'Ой! Произошла ошибка. Попробуйте еще раз позже.'
+        )
+    else:
+        if orders_stats:
+            outbox.sendMessage(
+                chat_id=update.message.chat_id,
+                text=u'Статистика заказов:\r\nЗаказов: {}\r\nСредний интервал: {:.1f} дн.\r\nРасход: {:.1f} бут. в неделю\r\nСледующий заказ: {}'.format(orders_stats['orders'],
+                                                                                                                                                         orders_stats['interval'],
+                                                                                                                                                         orders_stats['per_week'],
+                                                                                                                                                         orders_stats['next'].strftime('%d.%m.%Y'))
+            )
+        else:
+            outbox.sendMessage(
+                chat_id=update.message.chat_id,
+                text=u'Недостаточно заказов для статистики.'
+            )
+        logger.info('Stats request from user {}, id {} complete success'.format(update.message.from_user.first_name,
+                                                                                update.message.from_user.id))
+
+
 @restricted
 def order(bot, update):
-    bot.sendChatAction(update.message.chat_id, action=ChatAction.TYPING)
+    outbox.sendChatAction(update.message.chat_id, action=ChatAction.TYPING)
     try:
         global ecoline
         ecoline = ecoline_auth(ecoline)
@@ -453,14 +547,14 @@ def order(bot, update):
             text = u'{}\r\n\r\nИтоговая стоимость: {}'.format(text, ecoline.get_basket_cost())
             reply_markup = InlineKeyboardMarkup([[InlineKeyboardButton("Заказать", callback_data='order')],
                                                 [InlineKeyboardButton('Отменить заказ', callback_data='cancel')]])
-            bot.sendMessage(
+            outbox.sendMessage(
                 chat_id=update.message.chat_id,
                 text=text,
                 reply_markup=reply_markup
             )
     except Exception as exc:
         error(bot, update, exc)
-        bot.sendMessage(
+        outbox.sendMessage(
             chat_id=update.message.chat_id,
             text=u'Ой! Произошла ошибка. Попробуйте еще раз позже.'
         )
@@ -478,8 +572,11 @@ if __name__ == '__main__':
     logger = init_log(debug=args.debug)
     logger.info('Starting ecoline telegram bot')
 
+    args_debug = args.debug
+    config_lock = threading.Lock()
     cfg = get_config()
     ecoline = ecoline_auth(debug=args.debug)
+    stats_cache = {}
 
     # Ecoline site logic variables
     order_properties = {'orderType': 'phiz',
@@ -497,18 +594,26 @@ if __name__ == '__main__':
                     'CT8': '19.00-20.00'}
 
     updater = Updater(token=cfg['telegram']['token'])
+    outbox = Outbox(updater.bot)
     dp = updater.dispatcher
 
     start_handler = CommandHandler('start', start)
     help_handler = CommandHandler('help', help)
+    stats_handler = CommandHandler('stats', stats)
     message_handler = MessageHandler(Filters.text, message_handler)
     unknown_handler = MessageHandler(Filters.command, unknown)
 
     dp.add_handler(CallbackQueryHandler(order_handler))
     dp.add_handler(start_handler)
     dp.add_handler(help_handler)
+    dp.add_handler(stats_handler)
     dp.add_handler(message_handler)
     dp.add_handler(unknown_handler)
 
+    if hasattr(signal, 'SIGHUP'):
+        signal.signal(signal.SIGHUP, request_reload)
+    updater.job_queue.run_repeating(watch_config, CONFIG_RELOAD_INTERVAL)
+
     updater.start_polling()
     updater.idle()
+    outbox.stop()
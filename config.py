@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import yaml
+
+
+CONFIG_PATH = 'config.yml'
+
+STRING_TYPES = (str, type(u''))
+# YAML loads an all-digit login or password as a number, long on Python 2
+NUMBER_TYPES = (int, type(2 ** 64))
+ID_LIST_TYPES = (list, type(None))
+
+# Leaves are the accepted value types, a missing key is checked as None.
+# Sections listed in CONFIG_OPTIONAL_SECTIONS may be missing completely.
+CONFIG_SCHEMA = {'telegram': {'token': STRING_TYPES,
+                              'allow_user': ID_LIST_TYPES,
+                              'allow_chat': ID_LIST_TYPES},
+                 'ecoline': {'username': STRING_TYPES + NUMBER_TYPES,
+                             'password': STRING_TYPES + NUMBER_TYPES,
+                             'product': {'name': STRING_TYPES,
+                                         'quantity': (int,)}},
+                 'common': {'history_path': STRING_TYPES + (type(None),)}}
+CONFIG_OPTIONAL_SECTIONS = ('common',)
+
+
+class ConfigException(Exception):
+    """A bot config error occurred."""
+
+
+def validate_config(config, schema=CONFIG_SCHEMA, path=''):
+    if not isinstance(config, dict):
+        raise ConfigException('Section "{}" must be a mapping'.format(path or '/'))
+    for key, rule in schema.items():
+        name = '{}.{}'.format(path, key) if path else key
+        value = config.get(key)
+        if isinstance(rule, dict):
+            if value is None and name in CONFIG_OPTIONAL_SECTIONS:
+                continue
+            validate_config(value, rule, name)
+        elif not isinstance(value, rule):
+            raise ConfigException('Wrong type of "{}" value: {}'.format(name, type(value).__name__))
+
+
+def compile_allowlist(ids=None):
+    try:
+        return frozenset(int(i) for i in ids or ())
+    except (TypeError, ValueError) as exc:
+        raise ConfigException('Wrong telegram id in allowlist: {}'.format(exc))
+
+
+def load_config(path=CONFIG_PATH):
+    with open(path, 'r') as ymlfile:
+        config = yaml.safe_load(ymlfile)
+    validate_config(config)
+    for key in ('username', 'password'):
+        if isinstance(config['ecoline'][key], NUMBER_TYPES):
+            config['ecoline'][key] = str(config['ecoline'][key])
+    config['common'] = config.get('common') or {}
+    config['common'].setdefault('history_path', None)
+    config['telegram']['allow_user'] = compile_allowlist(config['telegram'].get('allow_user'))
+    config['telegram']['allow_chat'] = compile_allowlist(config['telegram'].get('allow_chat'))
+    return config
@@ -4,7 +4,10 @@
 import requests
 import re
 import datetime
+import time
 import logging
+import threading
+from functools import wraps
 from bs4 import BeautifulSoup
 
 
@@ -20,11 +23,136 @@ class EcolineCommonException(Exception):
     """An Ecoline site common error occured."""
 
 
+BONUS_RE = re.compile(u'Бонусы:\\s(\\d+)')
+ORDER_DATE_RE = re.compile(u'<td>(\\d+\\.\\d+\\.\\d+)')
+PRODUCT_LINK = u'<a href="/order/\\d+/(\\d+)/" title="{0}">{0}</a>'
+
+
+def find_logout(text):
+    return 'logout=yes' in text
+
+
+def find_bonus(text):
+    bonus = BONUS_RE.search(text)
+    if bonus:
+        return bonus.group(1)
+    else:
+        return False
+
+
+def find_order_date(text):
+    order_date = ORDER_DATE_RE.search(text)
+    if order_date:
+        return order_date.group(1)
+    else:
+        return False
+
+
+def find_order_dates(text):
+    return ORDER_DATE_RE.findall(text)
+
+
+def find_product_id(text, name):
+    product_id = re.search(PRODUCT_LINK.format(re.escape(name)), text)
+    if product_id:
+        return product_id.group(1)
+    else:
+        return False
+
+
+_account_locks = {}
+_account_locks_lock = threading.Lock()
+
+
+def _account_lock(username):
+    with _account_locks_lock:
+        return _account_locks.setdefault(username, threading.RLock())
+
+
+class _Flight(object):
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+def single_flight(func):
+    """Share one call of a read-only method between callers.
+
+    Concurrent callers wait for the same in-flight fetch and the result is
+    kept for ``cache_ttl`` seconds, so repeated taps handled one after
+    another reuse it too. The shared result is returned as is and must not
+    be modified. Results never outlive a mutation, and reads made by the
+    mutating method itself always hit the site.
+    """
+    @wraps(func)
+    def wrapped(self, *args):
+        if self._writer is threading.current_thread():
+            return func(self, *args)
+
+        key = (func.__name__, args, self._generation)
+        with self._flights_lock:
+            cached = self._results.get(key)
+            if cached and cached[0] > time.time():
+                return cached[1]
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+
+        if leader:
+            try:
+                flight.result = func(self, *args)
+            except Exception as exc:
+                flight.error = exc
+            finally:
+                with self._flights_lock:
+                    del self._flights[key]
+                    now = time.time()
+                    for old_key in [k for k, v in self._results.items() if v[0] <= now]:
+                        del self._results[old_key]
+                    if flight.error is None:
+                        self._results[key] = (now + self.cache_ttl, flight.result)
+                flight.done.set()
+        else:
+            flight.done.wait()
+
+        if flight.error is not None:
+            raise flight.error
+        return flight.result
+    return wrapped
+
+
+def serialized(func):
+    """Run a mutating method exclusively for the account."""
+    @wraps(func)
+    def wrapped(self, *args, **kwargs):
+        with self._account_lock:
+            writer = self._writer
+            self._writer = threading.current_thread()
+            self._generation += 1
+            try:
+                return func(self, *args, **kwargs)
+            finally:
+                self._generation += 1
+                self._writer = writer
+    return wrapped
+
+
 class Ecoline(object):
 
+    cache_ttl = 10
+
     def __init__(self, username='', password='', debug=None):
         self.username = username
         self.password = password
+        self._account_lock = _account_lock(username)
+        self._flights = {}
+        self._flights_lock = threading.Lock()
+        self._results = {}
+        self._generation = 0
+        self._writer = None
         self.base_url = 'https://www.ecoline-komi.ru'
         self.cookies = self.__auth()
         self.logger = self.__init_log(debug)
@@ -73,12 +201,7 @@ class Ecoline(object):
                 raise EcolineTransportException(exc)
             else:
                 if products:
-                    filter = u'.*\<a href=\\"\/order\/\d+\/(\d+)\/\\" title=\\"{}\\"\>{}\<\/a\>'.format(name, name)
-                    product_id = re.findall(filter, products.text, re.DOTALL)
-                    if product_id:
-                        return product_id[0]
-                    else:
-                        return False
+                    return find_product_id(products.text, name)
                 else:
                     return False
         else:
@@ -103,29 +226,25 @@ class Ecoline(object):
 
             return result
 
+    @single_flight
     def check_auth(self):
         try:
             html = requests.request('GET', '{}'.format(self.base_url), cookies=self.cookies)
         except Exception as exc:
             raise EcolineAuthException(exc)
         else:
-            if re.search(u'.*logout=yes.*', html.text, re.DOTALL):
-                return True
-            else:
-                return False
+            return find_logout(html.text)
 
+    @single_flight
     def get_bonus(self):
         try:
             profile = requests.request('GET', '{}/profile/'.format(self.base_url), cookies=self.cookies)
         except Exception as exc:
             raise EcolineTransportException(exc)
 
-        bonus = re.search(u'Бонусы:\s(\d+).*', profile.text, re.DOTALL)
-        if bonus:
-            return bonus.group(1)
-        else:
-            return False
+        return find_bonus(profile.text)
 
+    @single_flight
     def get_last_order(self):
         result = {}
         try:
@@ -133,14 +252,31 @@ class Ecoline(object):
         except Exception as exc:
             raise EcolineTransportException(exc)
 
-        orders_date = re.findall(u'\<td\>(\d+\.\d+\.\d+).*\</td\>', profile.text, re.DOTALL)
-        if orders_date:
-            days = (datetime.datetime.now() - datetime.datetime.strptime(orders_date[0], '%d.%m.%Y')).days
-            result.update({'date': orders_date[0], 'diff': days})
+        order_date = find_order_date(profile.text)
+        if order_date:
+            days = (datetime.datetime.now() - datetime.datetime.strptime(order_date, '%d.%m.%Y')).days
+            result.update({'date': order_date, 'diff': days})
             return result
         else:
             return False
 
+    def iter_orders(self, max_pages=100):
+        last_page = None
+        for page in range(1, max_pages + 1):
+            try:
+                html = requests.request('GET', '{}/profile/orders/?PAGEN_1={}'.format(self.base_url, page), cookies=self.cookies)
+            except Exception as exc:
+                raise EcolineTransportException(exc)
+
+            orders_date = find_order_dates(html.text)
+            # Site returns the last page again for out of range page numbers
+            if not orders_date or orders_date == last_page:
+                return
+            last_page = orders_date
+            for date in orders_date:
+                yield date
+
+    @single_flight
     def get_basket(self):
         headers = {'referer': '{}/order/make.php'.format(self.base_url)}
         result = []
@@ -166,6 +302,7 @@ class Ecoline(object):
             else:
                 return False
 
+    @single_flight
     def get_basket_cost(self):
         headers = {'referer': '{}/order/make.php'.format(self.base_url)}
         try:
@@ -183,6 +320,7 @@ class Ecoline(object):
             else:
                 False
 
+    @single_flight
     def get_order_properties(self):
         headers = {'referer': '{}/order/make.php'.format(self.base_url)}
         result = {}
@@ -202,6 +340,7 @@ class Ecoline(object):
                     result[item] = parser.find('input', attrs={'name': item}).attrs['value']
         return result
 
+    @serialized
     def clear_basket(self):
         headers = {'referer': '{}/order/make.php'.format(self.base_url)}
         basket = self.get_basket()
@@ -217,6 +356,7 @@ class Ecoline(object):
         else:
             return True
 
+    @serialized
     def add_to_basket(self, name='', quantity=1):
         headers = {'referer': '{}/order/1/'.format(self.base_url)}
         self.name = name
@@ -228,6 +368,7 @@ class Ecoline(object):
             except Exception as exc:
                 raise EcolineTransportException(exc)
 
+    @serialized
     def checkout(self, properties={}):
         headers = {'referer': '{}/order/make.php'.format(self.base_url)}
         basket = self.get_basket()
@@ -248,6 +389,7 @@ class Ecoline(object):
             else:
                 return order_status
 
+    @serialized
     def logout(self):
         try:
             requests.request('GET', '{}/?logout=yes'.format(self.base_url), cookies=self.cookies)
@@ -0,0 +1,175 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import time
+import logging
+import threading
+from collections import deque
+from telegram.error import RetryAfter
+
+
+class OutboxItem(object):
+
+    def __init__(self, method, chat_id, kwargs, key=None):
+        self.method = method
+        self.chat_id = chat_id
+        self.kwargs = kwargs
+        self.key = key
+
+
+class Outbox(object):
+    """Queue of outbound Bot API calls with global and per chat rate limits.
+
+    Pending edits of the same message are merged, chat actions repeated
+    within ``action_interval`` seconds are dropped and ``RetryAfter`` replies
+    pause the queue for the requested time.
+    """
+
+    def __init__(self, bot, global_interval=1.0 / 30, chat_interval=1.0, group_interval=3.0, action_interval=5.0):
+        self.bot = bot
+        self.global_interval = global_interval
+        self.chat_interval = chat_interval
+        self.group_interval = group_interval
+        self.action_interval = action_interval
+        self.logger = logging.getLogger('ecoline-telegram-bot')
+
+        self.__queue = deque()
+        self.__edits = {}
+        self.__chat_ready = {}
+        self.__last_action = {}
+        self.__ready = 0
+        self.__running = True
+        self.__cond = threading.Condition()
+        self.__worker = threading.Thread(target=self.__run, name='outbox')
+        self.__worker.daemon = True
+        self.__worker.start()
+
+    def __put(self, item):
+        with self.__cond:
+            self.__queue.append(item)
+            self.__cond.notify()
+
+    def __chat_interval(self, chat_id):
+        # Negative ids belong to groups and channels, which have stricter limits
+        return self.group_interval if int(chat_id) < 0 else self.chat_interval
+
+    def __next_item(self):
+        now = time.time()
+        wait = None
+        if self.__ready > now:
+            return None, self.__ready - now
+        for item in self.__queue:
+            ready = self.__chat_ready.get(item.chat_id, 0)
+            if ready <= now:
+                self.__queue.remove(item)
+                if item.key is not None:
+                    self.__edits.pop(item.key, None)
+                return item, None
+            if wait is None or ready - now < wait:
+                wait = ready - now
+        return None, wait
+
+    def __run(self):
+        while True:
+            try:
+                with self.__cond:
+                    item, wait = self.__next_item()
+                    while item is None:
+                        if not self.__running and not self.__queue:
+                            return
+                        self.__cond.wait(wait)
+                        item, wait = self.__next_item()
+                self.__send(item)
+            except Exception as exc:
+                # Keep the only sender thread alive, otherwise replies are queued forever
+                self.logger.error('Outbox error "{}({})"'.format(type(exc).__name__, exc))
+
+    def __send(self, item):
+        try:
+            getattr(self.bot, item.method)(chat_id=item.chat_id, **item.kwargs)
+        except RetryAfter as exc:
+            self.logger.warning('Flood limit on {} to chat {}, retry after {}s'.format(item.method, item.chat_id, exc.retry_after))
+            with self.__cond:
+                self.__ready = time.time() + exc.retry_after
+                if item.key is not None:
+                    item = self.__merge_failed(item)
+                    self.__edits[item.key] = item
+                self.__queue.appendleft(item)
+            return
+        except Exception as exc:
+            self.logger.error('Outbound {} to chat {} caused error "{}({})"'.format(item.method, item.chat_id, type(exc).__name__, exc))
+
+        with self.__cond:
+            now = time.time()
+            self.__ready = max(self.__ready, now + self.global_interval)
+            # Chat actions are not messages, they do not delay the reply itself
+            if item.method != 'send_chat_action':
+                self.__chat_ready[item.chat_id] = now + self.__chat_interval(item.chat_id)
+
+    def __merge_failed(self, item):
+        pending = self.__edits.pop(item.key, None)
+        if pending is None:
+            return item
+        self.__queue.remove(pending)
+        if item.method == 'edit_message_text' and pending.method == 'edit_message_reply_markup':
+            item.kwargs['reply_markup'] = pending.kwargs.get('reply_markup')
+            return item
+        # Pending edit was queued later and fully replaces the failed one
+        return pending
+
+    def __edit(self, method, chat_id, message_id, kwargs):
+        key = (chat_id, message_id)
+        with self.__cond:
+            pending = self.__edits.get(key)
+            if pending is None:
+                item = OutboxItem(method, chat_id, dict(kwargs, message_id=message_id), key)
+                self.__edits[key] = item
+                self.__queue.append(item)
+                self.__cond.notify()
+            elif method == 'edit_message_reply_markup' and pending.method == 'edit_message_text':
+                pending.kwargs['reply_markup'] = kwargs.get('reply_markup')
+            else:
+                # Later text edit fully defines the message, including its markup
+                pending.method = method
+                pending.kwargs = dict(kwargs, message_id=message_id)
+
+    def send_message(self, chat_id, text, **kwargs):
+        kwargs['text'] = text
+        self.__put(OutboxItem('send_message', chat_id, kwargs))
+
+    def send_chat_action(self, chat_id, action, **kwargs):
+        now = time.time()
+        with self.__cond:
+            if now - self.__last_action.get(chat_id, 0) < self.action_interval:
+                return
+            self.__last_action[chat_id] = now
+        kwargs['action'] = action
+        self.__put(OutboxItem('send_chat_action', chat_id, kwargs))
+
+    def edit_message_text(self, text, chat_id, message_id, **kwargs):
+        kwargs['text'] = text
+        self.__edit('edit_message_text', chat_id, message_id, kwargs)
+
+    def edit_message_reply_markup(self, chat_id, message_id, **kwargs):
+        self.__edit('edit_message_reply_markup', chat_id, message_id, kwargs)
+
+    def delete_message(self, chat_id, message_id, **kwargs):
+        kwargs['message_id'] = message_id
+        with self.__cond:
+            pending = self.__edits.pop((chat_id, message_id), None)
+            if pending is not None:
+                self.__queue.remove(pending)
+            self.__queue.append(OutboxItem('delete_message', chat_id, kwargs))
+            self.__cond.notify()
+
+    def stop(self):
+        with self.__cond:
+            self.__running = False
+            self.__cond.notify()
+        self.__worker.join()
+
+    # camelCase aliases, same as telegram.Bot
+    sendMessage = send_message
+    sendChatAction = send_chat_action
+    editMessageText = edit_message_text
+    editMessageReplyMarkup = edit_message_reply_markup
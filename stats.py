@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+from datetime import datetime, date
+
+
+HISTORY_FIELDS = (7, 8)
+
+
+def parse_history_line(line):
+    """Split an order log line, return None for a line that is not a record.
+
+    Old logs have 7 fields, the ordered quantity was added as the 8th one.
+    """
+    item = line.strip().split(';')
+    if len(item) not in HISTORY_FIELDS:
+        return None
+    try:
+        datetime.strptime(item[0], '%d.%m.%Y')
+        if len(item) > 7:
+            int(item[7])
+    except ValueError:
+        return None
+    return item
+
+
+def append_history(path, line):
+    # Old versions wrote the log without a trailing newline
+    try:
+        with open(path, 'rb') as history:
+            history.seek(0, os.SEEK_END)
+            if history.tell():
+                history.seek(-1, os.SEEK_END)
+                if history.read(1) != b'\n':
+                    line = '\n' + line
+    except (IOError, OSError):
+        pass
+
+    with open(path, 'a') as history:
+        history.write(line + '\n')
+
+
+def iter_history_records(path):
+    with open(path, 'r') as history:
+        for line in history:
+            item = parse_history_line(line)
+            if item is not None:
+                yield item
+
+
+def last_history_record(path):
+    item = None
+    for item in iter_history_records(path):
+        pass
+    return item
+
+
+def iter_history(path):
+    for item in iter_history_records(path):
+        quantity = int(item[7]) if len(item) > 7 else None
+        yield datetime.strptime(item[0], '%d.%m.%Y').date(), quantity
+
+
+def order_stats(orders, quantity=1):
+    """Fold a stream of ``(date, quantity)`` orders into consumption stats.
+
+    Orders of the same day are counted once, so site and bot history can be
+    chained together. Bottles of the last order are not consumed yet and are
+    left out of the weekly rate.
+    """
+    days = {}
+    for order_date, order_quantity in orders:
+        day = order_date.toordinal()
+        days[day] = max(days.get(day, 0), order_quantity or quantity)
+
+    if len(days) < 2:
+        return False
+
+    first = min(days)
+    last = max(days)
+    span = last - first
+    interval = float(span) / (len(days) - 1)
+    bottles = sum(days.values()) - days[last]
+
+    return {'orders': len(days),
+            'first': date.fromordinal(first),
+            'last': date.fromordinal(last),
+            'interval': interval,
+            'per_week': bottles * 7.0 / span,
+            'next': date.fromordinal(last + int(round(interval)))}
@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Stress benchmark of the page extractors on multi-megabyte synthetic pages.
+
+Run with ``python tests/benchmark_extractors.py``. Time per MB should stay
+flat while page size grows. ``--legacy`` also times the old ``.*`` DOTALL
+patterns on small pages for comparison.
+"""
+
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ecoline import find_bonus, find_logout, find_order_date, find_product_id  # noqa: E402
+
+
+NAME = u'Краснозатонская Серебряная'
+FILLER = u'<div class="item"><td>lorem ipsum</td> Бонусы: нет, title="x"</div>\n'
+TAIL = (u'<a href="/?logout=yes">Выйти</a><td>15.01.2019</td> Бонусы: 340 '
+        u'<a href="/order/1/12/" title="{0}">{0}</a>').format(NAME)
+
+
+def extract(page):
+    return (find_logout(page),
+            find_bonus(page),
+            find_order_date(page),
+            find_product_id(page, NAME))
+
+
+def extract_legacy(page):
+    filter = u'.*\\<a href=\\"\\/order\\/\\d+\\/(\\d+)\\/\\" title=\\"{}\\"\\>{}\\<\\/a\\>'.format(NAME, NAME)
+    return (bool(re.search(u'.*logout=yes.*', page, re.DOTALL)),
+            re.search(u'Бонусы:\\s(\\d+).*', page, re.DOTALL).group(1),
+            re.findall(u'\\<td\\>(\\d+\\.\\d+\\.\\d+).*\\</td\\>', page, re.DOTALL)[0],
+            re.findall(filter, page, re.DOTALL)[0])
+
+
+def make_page(size, top=False):
+    # Matches at the very end make every extractor scan the whole page,
+    # matches at the top make the legacy patterns backtrack over all of it
+    filler = FILLER * (size // len(FILLER))
+    return TAIL + filler if top else filler + TAIL
+
+
+def measure(func, page, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.time()
+        result = func(page)
+        elapsed = time.time() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    print('{:>8} {:>10} {:>10}'.format('size', 'seconds', 's/MB'))
+    for mb in (1, 2, 4, 8, 16):
+        elapsed, result = measure(extract, make_page(mb * 2 ** 20))
+        assert result == (True, '340', '15.01.2019', '12')
+        print('{:>6}MB {:>10.4f} {:>10.4f}'.format(mb, elapsed, elapsed / mb))
+
+    if '--legacy' in sys.argv:
+        print('legacy patterns, matches at the top')
+        for kb in (16, 32, 64):
+            page = make_page(kb * 2 ** 10, top=True)
+            elapsed, result = measure(extract_legacy, page, repeat=1)
+            assert result == extract(page)
+            print('{:>6}KB {:>10.4f}'.format(kb, elapsed))
+
+
+if __name__ == '__main__':
+    main()
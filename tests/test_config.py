@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+import yaml
+from config import ConfigException, compile_allowlist, load_config, validate_config
+
+
+CONFIG = u'''
+telegram:
+    token: tg-token
+    allow_user:
+        - 123
+        - 456
+    allow_chat:
+        - -100500
+ecoline:
+    username: user
+    password: secret
+    product:
+        name: 'Краснозатонская Серебряная'
+        quantity: 2
+common:
+    history_path: orders.log
+'''
+
+
+def write_config(tmp_path, text):
+    path = tmp_path / 'config.yml'
+    path.write_bytes(text.encode('utf-8'))
+    return str(path)
+
+
+def test_load_config(tmp_path):
+    cfg = load_config(write_config(tmp_path, CONFIG))
+    assert cfg['telegram']['allow_user'] == frozenset([123, 456])
+    assert cfg['telegram']['allow_chat'] == frozenset([-100500])
+    assert cfg['common']['history_path'] == 'orders.log'
+
+
+def test_common_section_is_optional(tmp_path):
+    cfg = load_config(write_config(tmp_path, CONFIG.split(u'common:')[0]))
+    assert cfg['common'] == {'history_path': None}
+
+
+def test_missing_allowlists_are_empty(tmp_path):
+    text = CONFIG.replace(u'    allow_chat:\n        - -100500\n', u'')
+    cfg = load_config(write_config(tmp_path, text))
+    assert cfg['telegram']['allow_chat'] == frozenset()
+
+
+def test_numeric_credentials_become_strings(tmp_path):
+    text = CONFIG.replace(u'username: user', u'username: 79121234567').replace(u'password: secret', u'password: 1234')
+    cfg = load_config(write_config(tmp_path, text))
+    assert cfg['ecoline']['username'] == '79121234567'
+    assert cfg['ecoline']['password'] == '1234'
+
+
+def test_compile_allowlist():
+    assert compile_allowlist(None) == frozenset()
+    assert compile_allowlist([1, '2']) == frozenset([1, 2])
+    with pytest.raises(ConfigException):
+        compile_allowlist(['tg-user-id'])
+
+
+def test_validate_config_rejects_wrong_types():
+    cfg = yaml.safe_load(CONFIG)
+    validate_config(cfg)
+    cfg['ecoline']['product']['quantity'] = 'two'
+    with pytest.raises(ConfigException) as exc:
+        validate_config(cfg)
+    assert 'ecoline.product.quantity' in str(exc.value)
+
+
+@pytest.mark.parametrize('text', [u'', u'telegram: 5\n', CONFIG + u'common: 5\n', CONFIG.replace(u'token: tg-token', u'token: [1]')])
+def test_load_config_rejects_invalid(tmp_path, text):
+    with pytest.raises(ConfigException):
+        load_config(write_config(tmp_path, text))
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+
+import threading
+import time
+import pytest
+import ecoline
+from ecoline import Ecoline
+
+
+class FakeResponse(object):
+
+    def __init__(self, text=u''):
+        self.text = text
+        self.cookies = {'ECOLINE_SM_SALE_UID': '1'}
+
+
+@pytest.fixture
+def site(monkeypatch):
+    calls = []
+
+    def request(method, url, **kwargs):
+        calls.append(url)
+        time.sleep(0.05)
+        return FakeResponse(u'Бонусы: {} '.format(len(calls)))
+
+    monkeypatch.setattr(ecoline.requests, 'request', request)
+    client = Ecoline(username='user', password='secret')
+    del calls[:]
+    return client, calls
+
+
+def test_concurrent_reads_share_one_fetch(site):
+    client, calls = site
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(client.get_bonus())) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert results == ['1'] * 5
+
+
+def test_sequential_reads_use_cache_until_ttl(site):
+    client, calls = site
+    assert client.get_bonus() == client.get_bonus() == '1'
+    assert len(calls) == 1
+
+    client.cache_ttl = 0
+    client._results.clear()
+    client.get_bonus()
+    client.get_bonus()
+    assert len(calls) == 3
+
+
+def test_mutation_drops_cache_and_reads_inside_it_are_fresh(site):
+    client, calls = site
+    client.get_bonus()
+
+    @ecoline.serialized
+    def mutate(self):
+        return self.get_bonus(), self.get_bonus()
+
+    assert mutate(client) == ('2', '3')
+    assert client.get_bonus() == '4'
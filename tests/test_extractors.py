@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+
+import io
+import os
+import time
+from ecoline import find_bonus, find_logout, find_order_date, find_order_dates, find_product_id
+
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+FILLER = u'<div class="item"><td>lorem ipsum</td> Бонусы: нет, title="x"</div>\n'
+
+
+def fixture(name):
+    with io.open(os.path.join(FIXTURES, name), encoding='utf-8') as page:
+        return page.read()
+
+
+def test_find_logout():
+    assert find_logout(fixture('index.html')) is True
+    assert find_logout(fixture('profile.html')) is False
+
+
+def test_find_bonus():
+    assert find_bonus(fixture('profile.html')) == '340'
+    assert find_bonus(fixture('index.html')) is False
+
+
+def test_find_order_date():
+    assert find_order_date(fixture('orders.html')) == '15.01.2019'
+    assert find_order_date(fixture('profile.html')) is False
+
+
+def test_find_order_dates():
+    assert find_order_dates(fixture('orders.html')) == ['15.01.2019', '01.01.2019', '18.12.2018']
+    assert find_order_dates(fixture('index.html')) == []
+
+
+def test_find_product_id():
+    page = fixture('order_1.html')
+    assert find_product_id(page, u'Краснозатонская') == '11'
+    assert find_product_id(page, u'Краснозатонская Серебряная') == '12'
+    assert find_product_id(page, u'Вода (19 л.) + помпа?') == '13'
+    assert find_product_id(page, u'Вода [19 л] x2') == '14'
+    assert find_product_id(page, u'Вода (19 л') is False
+    assert find_product_id(page, u'.*') is False
+
+
+def test_extractors_on_large_page():
+    page = FILLER * (8 * 2 ** 20 // len(FILLER))
+    start = time.time()
+    assert find_logout(page) is False
+    assert find_bonus(page) is False
+    assert find_order_date(page) is False
+    assert find_product_id(page, u'Вода (19 л.) + помпа?') is False
+    # Linear scans take tens of milliseconds here, backtracking takes minutes
+    assert time.time() - start < 2
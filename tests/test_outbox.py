@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+
+import threading
+import pytest
+from telegram.error import RetryAfter
+from outbox import Outbox
+
+
+class FakeBot(object):
+
+    def __init__(self):
+        self.calls = []
+        self.hooks = {}
+
+    def __getattr__(self, method):
+        def call(**kwargs):
+            hook = self.hooks.pop(method, None)
+            if hook is not None:
+                hook()
+            self.calls.append((method, kwargs))
+        return call
+
+
+@pytest.fixture
+def bot():
+    return FakeBot()
+
+
+@pytest.fixture
+def outbox(bot):
+    outbox = Outbox(bot, global_interval=0, chat_interval=0, group_interval=0)
+    yield outbox
+    outbox.stop()
+
+
+def hold_sender(bot, outbox):
+    """Keep the sender thread busy, so following calls stay queued."""
+    started = threading.Event()
+    release = threading.Event()
+
+    def hook():
+        started.set()
+        release.wait(5)
+
+    bot.hooks['send_message'] = hook
+    outbox.send_message(chat_id=2, text='busy')
+    started.wait(5)
+    return release
+
+
+def sent(bot):
+    return [(method, kwargs) for method, kwargs in bot.calls if kwargs['chat_id'] == 1]
+
+
+def test_markup_edit_merges_into_pending_text_edit(bot, outbox):
+    release = hold_sender(bot, outbox)
+    outbox.editMessageText(chat_id=1, message_id=5, text='date', reply_markup='dates')
+    outbox.editMessageReplyMarkup(chat_id=1, message_id=5, reply_markup='times')
+    release.set()
+    outbox.stop()
+
+    assert sent(bot) == [('edit_message_text', {'chat_id': 1, 'message_id': 5, 'text': 'date', 'reply_markup': 'times'})]
+
+
+def test_text_edit_replaces_pending_markup_edit(bot, outbox):
+    release = hold_sender(bot, outbox)
+    outbox.editMessageReplyMarkup(chat_id=1, message_id=5, reply_markup='dates')
+    outbox.editMessageText(chat_id=1, message_id=5, text='date')
+    release.set()
+    outbox.stop()
+
+    assert sent(bot) == [('edit_message_text', {'chat_id': 1, 'message_id': 5, 'text': 'date'})]
+
+
+def test_delete_drops_pending_edit(bot, outbox):
+    release = hold_sender(bot, outbox)
+    outbox.editMessageText(chat_id=1, message_id=5, text='date')
+    outbox.delete_message(chat_id=1, message_id=5)
+    release.set()
+    outbox.stop()
+
+    assert sent(bot) == [('delete_message', {'chat_id': 1, 'message_id': 5})]
+
+
+def test_chat_action_throttling(bot, outbox):
+    outbox.sendChatAction(1, action='typing')
+    outbox.sendChatAction(1, action='typing')
+    outbox.sendChatAction(3, action='typing')
+    outbox.stop()
+
+    assert [kwargs['chat_id'] for method, kwargs in bot.calls] == [1, 3]
+
+
+def test_retry_after_merges_markup_edit_queued_meanwhile(bot, outbox):
+    def flood():
+        outbox.editMessageReplyMarkup(chat_id=1, message_id=5, reply_markup='times')
+        raise RetryAfter(0.01)
+
+    bot.hooks['edit_message_text'] = flood
+    outbox.editMessageText(chat_id=1, message_id=5, text='date', reply_markup='dates')
+    outbox.stop()
+
+    assert sent(bot) == [('edit_message_text', {'chat_id': 1, 'message_id': 5, 'text': 'date', 'reply_markup': 'times'})]
+
+
+def test_retry_after_keeps_newer_text_edit(bot, outbox):
+    def flood():
+        outbox.editMessageText(chat_id=1, message_id=5, text='time')
+        raise RetryAfter(0.01)
+
+    bot.hooks['edit_message_text'] = flood
+    outbox.editMessageText(chat_id=1, message_id=5, text='date', reply_markup='dates')
+    outbox.stop()
+
+    assert sent(bot) == [('edit_message_text', {'chat_id': 1, 'message_id': 5, 'text': 'time'})]
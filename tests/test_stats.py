@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+
+from datetime import date
+from stats import append_history, iter_history, last_history_record, order_stats, parse_history_line
+
+
+OLD_RECORD = '01.01.2019;10:00:00;02.01.2019;9.00-11.00;cash;Bob;123'
+
+
+def test_append_to_old_format_log(tmp_path):
+    path = str(tmp_path / 'order.log')
+    with open(path, 'w') as history:
+        history.write(OLD_RECORD)
+
+    append_history(path, '15.01.2019;10:01:00;16.01.2019;9.00-11.00;cash;Bob;123;2')
+
+    with open(path) as history:
+        lines = history.read().splitlines()
+    assert lines[0] == OLD_RECORD
+    assert parse_history_line(lines[1])[6] == '123'
+    assert list(iter_history(path)) == [(date(2019, 1, 1), None), (date(2019, 1, 15), 2)]
+
+
+def test_iter_history_skips_broken_lines(tmp_path):
+    path = str(tmp_path / 'order.log')
+    with open(path, 'w') as history:
+        history.write(OLD_RECORD + '15.01.2019;10:01:00;16.01.2019;9.00-11.00;cash;Bob;123;2\n')
+        history.write('01.02.2019;10:00:00;02.02.2019;9.00-11.00;cash;Bob;123;two\n')
+        history.write('\n')
+        history.write('01.03.2019;10:00:00;02.03.2019;9.00-11.00;cash;Bob;123;3\n')
+
+    assert list(iter_history(path)) == [(date(2019, 3, 1), 3)]
+
+
+def test_order_stats():
+    orders = [(date(2019, 1, 1), None), (date(2019, 1, 15), 3), (date(2019, 1, 15), None), (date(2019, 1, 29), None)]
+    stats = order_stats(orders, 2)
+    assert stats['orders'] == 3
+    assert stats['interval'] == 14.0
+    assert stats['per_week'] == 1.25
+    assert stats['next'] == date(2019, 2, 12)
+
+
+def test_order_stats_not_enough_orders():
+    assert order_stats([(date(2019, 1, 1), 2)]) is False
+
+
+def test_last_history_record(tmp_path):
+    path = str(tmp_path / 'order.log')
+    with open(path, 'w') as history:
+        history.write(OLD_RECORD + '\n')
+        history.write('15.01.2019;10:01:00;16.01.2019;9.00-11.00;cash;Alice;456;2\n')
+        history.write('broken line\n')
+
+    assert last_history_record(path)[5:] == ['Alice', '456', '2']
+
+
+def test_last_history_record_empty_log(tmp_path):
+    path = str(tmp_path / 'order.log')
+    open(path, 'w').close()
+    assert last_history_record(path) is None